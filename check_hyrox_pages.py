@@ -4,7 +4,16 @@ import time
 import smtplib
 import sys
 import re
-from urllib.parse import urlparse, urlunparse
+import hashlib
+import tempfile
+import stat
+import html
+import asyncio
+import io
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import Value
+from multiprocessing.util import Finalize
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
@@ -14,19 +23,66 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException
-from PIL import Image, ImageDraw, ImageFont
+from selenium.common.exceptions import TimeoutException, InvalidSessionIdException, WebDriverException
+try:
+    from selenium.webdriver.remote.client_config import ClientConfig
+except ImportError:
+    ClientConfig = None
+try:
+    from selenium.webdriver.common.driver_finder import DriverFinder
+except ImportError:
+    DriverFinder = None
+from PIL import Image, ImageColor, ImageDraw, ImageFont
 from datetime import datetime
 import pytz
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
 
 # Configuration file names
 TICKET_DETAILS_CONFIG = "config.json"
 ON_SALE_CONFIG = "onsale_config.json"
 MATRIX_STATE_FILE = "matrix_last_state.json"
 MATRIX_OUTPUT_FILE = "availability_matrix.png"
+LABEL_CACHE_DIR = ".label_cache"
+DRIVER_POOL_MAXSIZE = 10
+# Read timeout on WebDriver HTTP calls (also Selenium's own default)
+DRIVER_HTTP_TIMEOUT = 120
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+HTTP_TIMEOUT = 30
+HTTP_CACHE_FILE = ".http_cache.json"
+NOT_MODIFIED = object()  # prefetch result for a page that is byte-for-byte the same as last run
+ON_SALE_KEYWORDS = ("buy tickets", "register now", "get tickets")
+# Pages render in well under a second, so the default 0.5s poll dominates the waits
+POLL_FREQUENCY = 0.1
+MENU_CONTENT_CSS = ".card-list-item, .ticket-type, a[class*='vi-rounded-lg']"
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.ico", "*.svg", "*.mp4", "*.webm",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*google-analytics*", "*googletagmanager*", "*doubleclick*", "*facebook.net*", "*hotjar*", "*/analytics/*",
+]
+
+# Locators, built once instead of on every loop iteration
+USERCENTRICS_ROOT = (By.ID, "usercentrics-root")
+USERCENTRICS_ACCEPT = (By.CSS_SELECTOR, "button[data-testid='uc-accept-all-button']")
+COOKIE_ACCEPT_BUTTONS = (By.XPATH, "//button[contains(@class, 'rcb-btn-accept-all')] | "
+                                   "//button[normalize-space()='Accept all'] | //a[normalize-space()='Accept all']")
+TICKET_TYPE = (By.CSS_SELECTOR, ".ticket-type")
+TICKET_ADD_BUTTON = (By.CSS_SELECTOR, ".ticket-type button[aria-label^='Add']")
+BUY_TICKETS_BUTTON = (By.CSS_SELECTOR, "button[aria-label='Buy Tickets here']")
+ATHLETE_TICKETS_LINK = (By.XPATH, "//a[contains(., 'Athlete Tickets')]")
+SELLMODAL_ANCHOR = (By.ID, "sellmodal-anchor")
+CHECKOUT_OBJECT = (By.CSS_SELECTOR, "object[data*='checkout']")
+CHECKOUT_IFRAME = (By.CSS_SELECTOR, "iframe[src*='checkout'], iframe[src*='vivenu']")
+INDIA_BUY_KEYWORDS = ["buy ticket", "register", "get ticket", "book now", "tickets"]
 
 # --- HELPER FUNCTIONS ---
-def setup_driver(headless=True):
+def setup_driver(headless=True, profile="main"):
     chrome_options = Options()
     if headless:
         chrome_options.add_argument("--headless")
@@ -34,12 +90,149 @@ def setup_driver(headless=True):
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument("--window-size=1920,1080")
     chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
-    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
-    service = Service()
-    return webdriver.Chrome(service=service, options=chrome_options)
+    chrome_options.add_argument(f"user-agent={USER_AGENT}")
+    # driver.get returns at DOMContentLoaded; the explicit waits are the real readiness gate
+    chrome_options.page_load_strategy = 'eager'
+    # Only text is scraped, so don't download or decode images; no notification prompts either
+    chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+    chrome_options.add_experimental_option('prefs', {
+        'profile.managed_default_content_settings.images': 2,
+        'profile.default_content_setting_values.notifications': 2,
+    })
+    # Persistent profile/cache dirs (restored by the workflow) keep Chrome's HTTP cache warm between runs.
+    # One subfolder per profile: parallel Chromes can't share a user-data-dir.
+    # With SELENIUM_REMOTE_URL the session runs on an already running chromedriver/standalone-chrome, so no
+    # local driver or browser is installed or launched (the server still starts a browser per session).
+    # Its filesystem isn't ours, so the local profile/cache dirs don't apply there
+    remote_url = os.getenv("SELENIUM_REMOTE_URL")
+    if remote_url:
+        driver = webdriver.Remote(command_executor=remote_url, options=chrome_options)
+        driver.profile_name = profile
+        return driver
+    profile_root = os.getenv("CHROME_PROFILE_DIR")
+    if profile_root:
+        profile_dir = os.path.join(profile_root, profile)
+        # A profile restored from the Actions cache still carries the lock links of the run that saved it
+        for lock in ("SingletonLock", "SingletonSocket", "SingletonCookie"):
+            try: os.remove(os.path.join(profile_dir, lock))
+            except OSError: pass
+        chrome_options.add_argument(f"--user-data-dir={profile_dir}")
+    cache_root = os.getenv("CHROME_CACHE_DIR")
+    if cache_root:
+        chrome_options.add_argument(f"--disk-cache-dir={os.path.join(cache_root, profile)}")
+    if os.getenv("CHROME_BINARY"):
+        chrome_options.binary_location = os.environ["CHROME_BINARY"]
+    service = Service(executable_path=os.getenv("CHROMEDRIVER"))
+    driver = webdriver.Chrome(service=service, options=chrome_options)
+    driver.profile_name = profile
+    _enlarge_connection_pool(driver, service)
+    _block_heavy_requests(driver)
+    return driver
 
-def send_email(subject, html_body, recipient_email, mail_username, mail_password, attachment_path=None):
-    if not recipient_email or not mail_username: return 
+def resolve_chrome_binaries():
+    # Run Selenium Manager once in the parent; pool workers inherit the paths through the environment
+    if os.getenv("CHROMEDRIVER") or os.getenv("SELENIUM_REMOTE_URL") or DriverFinder is None: return
+    try:
+        finder = DriverFinder(Service(), Options())
+        os.environ["CHROMEDRIVER"] = finder.get_driver_path()
+        browser_path = finder.get_browser_path()
+        if browser_path: os.environ["CHROME_BINARY"] = browser_path
+    except Exception as e: print(f"Could not pre-resolve chromedriver: {e}")
+
+def _block_heavy_requests(driver):
+    # CSS is left alone: the visibility checks rely on real layout
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+    except Exception as e: print(f"Could not set blocked URLs: {e}")
+
+def _enlarge_connection_pool(driver, service):
+    # webdriver.Chrome doesn't take a client_config, so swap in a bigger urllib3 pool after start-up
+    if ClientConfig is None: return
+    try:
+        executor = driver.command_executor
+        executor._client_config = ClientConfig(
+            remote_server_addr=service.service_url, keep_alive=True, timeout=DRIVER_HTTP_TIMEOUT,
+            init_args_for_pool_manager={"init_args_for_pool_manager": {"maxsize": DRIVER_POOL_MAXSIZE}})
+        executor._conn.clear()
+        executor._conn = executor._get_connection_manager()
+    except Exception as e: print(f"Could not resize driver connection pool: {e}")
+
+def restart_driver(driver, headless=True):
+    profile = getattr(driver, 'profile_name', "main")
+    try: driver.quit()
+    except Exception: pass
+    return setup_driver(headless, profile)
+
+def run_site(process, site_config, driver, headless=True, **kwargs):
+    # Returns (result, driver); the browser is rebuilt once if its session died mid-run
+    try:
+        return process(site_config, driver, **kwargs), driver
+    except InvalidSessionIdException:
+        print("  ! Browser session lost. Restarting driver and retrying site.")
+        driver = restart_driver(driver, headless)
+        return process(site_config, driver, **kwargs), driver
+
+# --- PLAIN HTTP FETCH ---
+async def _fetch(session, url, validators=None):
+    # validators is the url's {"etag", "last_modified", "hash"} entry from last run.
+    # Returns (html, None or NOT_MODIFIED; the page's new validators or None)
+    headers = {}
+    if validators is not None:
+        if validators.get("etag"): headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"): headers["If-Modified-Since"] = validators["last_modified"]
+    try:
+        async with session.get(url, headers=headers) as resp:
+            if resp.status == 304: return NOT_MODIFIED, None
+            if resp.status != 200:
+                print(f"  ! HTTP {resp.status} for {url}")
+                return None, None
+            body = await resp.read()
+            fresh = None
+            if validators is not None:
+                digest = hashlib.blake2b(body).hexdigest()
+                if digest == validators.get("hash"): return NOT_MODIFIED, None
+                fresh = {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified"), "hash": digest}
+            return await resp.text(), fresh
+    except Exception as e:
+        print(f"  ! HTTP fetch failed for {url}: {e}")
+        return None, None
+
+async def _fetch_all(urls, cache=None):
+    headers = {"User-Agent": USER_AGENT, "Accept": "text/html,application/xhtml+xml"}
+    timeout = aiohttp.ClientTimeout(total=HTTP_TIMEOUT)
+    async with aiohttp.ClientSession(headers=headers, timeout=timeout) as session:
+        return await asyncio.gather(*(_fetch(session, u, None if cache is None else cache.get(u, {})) for u in urls))
+
+def prefetch_pages(urls, cache=None):
+    # Fetches static pages concurrently without the browser.
+    # Returns ({url: html, None or NOT_MODIFIED}, {url: new validators}). With a cache dict the requests are
+    # conditional, but cache itself is left alone: a page's validators are only recorded once it has been checked.
+    if aiohttp is None or not urls: return {}, {}
+    results = asyncio.run(_fetch_all(urls, cache))
+    pages = {u: page for u, (page, _) in zip(urls, results)}
+    fresh = {u: v for u, (_, v) in zip(urls, results) if v}
+    return pages, fresh
+
+def load_http_cache():
+    try: return load_json(HTTP_CACHE_FILE)
+    except Exception: return {}
+
+def reset_browser_state(driver):
+    # Clears cookies and storage of the last visited origin so the next site starts clean
+    try:
+        if not hasattr(driver, 'execute_cdp_cmd'):
+            # Remote sessions have no CDP endpoint; plain WebDriver only reaches the current origin
+            driver.delete_all_cookies()
+            driver.execute_script("try { localStorage.clear(); sessionStorage.clear(); } catch (e) {}")
+            return
+        origin = driver.execute_script("return window.location.origin;")
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        if origin and origin.startswith("http"):
+            driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+    except Exception as e: print(f"Could not reset browser state: {e}")
+
+def _build_msg(subject, html_body, recipient_email, mail_username, attachment_path=None):
     msg = MIMEMultipart('alternative')
     msg['Subject'] = subject
     msg['From'] = f"Hyrox Monitor Bot <{mail_username}>"
@@ -50,12 +243,103 @@ def send_email(subject, html_body, recipient_email, mail_username, mail_password
             img = MIMEImage(f.read())
             img.add_header('Content-ID', '<matrix_image>')
             msg.attach(img)
+    return msg
+
+class SMTPSession:
+    # One authenticated Gmail connection shared by every message in a run
+    def __init__(self, mail_username, mail_password):
+        self.mail_username = mail_username
+        self.mail_password = mail_password
+        self.server = None
+
+    def __enter__(self):
+        self._connect()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _connect(self):
+        self.close()
+        self.server = smtplib.SMTP_SSL('smtp.gmail.com', 465)
+        self.server.login(self.mail_username, self.mail_password)
+
+    def send(self, msg):
+        # Cheap NOOP health check; reconnect once if Gmail dropped the idle connection
+        try:
+            if self.server is None: raise smtplib.SMTPServerDisconnected()
+            self.server.noop()
+        except smtplib.SMTPServerDisconnected:
+            self._connect()
+        self.server.send_message(msg)
+
+    def close(self):
+        if self.server is None: return
+        try: self.server.quit()
+        except Exception: pass
+        self.server = None
+
+def send_many(messages, mail_username, mail_password):
+    if not messages or not mail_username: return
     try:
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
-            server.login(mail_username, mail_password)
-            server.send_message(msg)
+        with SMTPSession(mail_username, mail_password) as session:
+            for msg in messages:
+                try: session.send(msg)
+                except Exception as e: print(f"Error sending email '{msg['Subject']}': {e}")
     except Exception as e: print(f"Error sending email: {e}")
 
+def send_email(subject, html_body, recipient_email, mail_username, mail_password, attachment_path=None):
+    if not recipient_email or not mail_username: return 
+    send_many([_build_msg(subject, html_body, recipient_email, mail_username, attachment_path)], mail_username, mail_password)
+
+def parse_json(raw):
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
+def load_json(path):
+    with open(path, 'rb') as f: return parse_json(f.read())
+
+def read_bytes(path):
+    try:
+        with open(path, 'rb') as f: return f.read()
+    except OSError: return b''
+
+def dump_json(data, pretty=True):
+    # UTF-8 bytes, identical layout whichever backend is installed
+    if orjson:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        return orjson.dumps(data, option=option)
+    if pretty: return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def canonical_json(data):
+    # Compact, key-sorted bytes: equal data compares with one memcmp instead of a nested dict walk
+    if orjson: return orjson.dumps(data, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def write_bytes(path, data):
+    # Write-then-rename so a crash mid-write never leaves a truncated status file behind.
+    # Unique temp name in the target's directory: os.replace must stay on one filesystem, and
+    # two writers can't clobber each other's temp file.
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f: f.write(data)
+        # mkstemp creates 0600; keep the target's mode, or what a plain open() would have given a new file
+        try: mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            umask = os.umask(0); os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+
+def save_json(path, data, pretty=True):
+    # No write (and no mtime bump for git/actions to notice) when the file already holds these bytes
+    new = dump_json(data, pretty)
+    if read_bytes(path) != new: write_bytes(path, new)
+
 def normalize_text(text):
     if not isinstance(text, str): return text
     text = re.sub(r'[^\x00-\x7F]+', '', text)
@@ -65,25 +349,77 @@ def normalize_text(text):
 def _normalize_for_matrix(text):
     return text.upper().replace("'", "")
 
-def set_github_output(name, value):
-    github_output_path = os.getenv('GITHUB_OUTPUT')
-    if github_output_path:
-        with open(github_output_path, 'a') as f:
-            f.write(f'{name}={value}\n')
+class GithubOutput:
+    # Collects outputs and appends them to $GITHUB_OUTPUT in one open/write when the block ends
+    def __init__(self):
+        self.lines = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        github_output_path = os.getenv('GITHUB_OUTPUT')
+        if github_output_path and self.lines:
+            fd = os.open(github_output_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+            try: os.write(fd, ''.join(self.lines).encode('utf-8'))
+            finally: os.close(fd)
+        self.lines = []
+
+    def emit(self, name, value):
+        value = str(value)
+        if '\n' in value:
+            # Multi-line values need the heredoc form
+            delim = f"EOF_{hashlib.sha1(value.encode('utf-8')).hexdigest()}"
+            self.lines.append(f'{name}<<{delim}\n{value}\n{delim}\n')
+        else:
+            self.lines.append(f'{name}={value}\n')
+
+# Everything before the query string / fragment
+_CLEAN_URL = re.compile(r'^([^?#]+)')
 
 def clean_checkout_url(url):
     if not url: return None
     try:
-        parsed = urlparse(url)
-        clean = urlunparse((parsed.scheme, parsed.netloc, parsed.path, '', '', ''))
-        return clean
+        m = _CLEAN_URL.match(url)
+        return m.group(1) if m else url
     except:
         return url
 
+# --- CHANGE LOG ---
+def status_changes(prev_status, curr_status):
+    # Ticket-level add/remove/replace ops between two status snapshots
+    prev_map = {t['name']: t['status'] for t in prev_status.get("General", {}).get("details", [])}
+    curr_map = {t['name']: t['status'] for t in curr_status.get("General", {}).get("details", [])}
+    ops = []
+    for name in sorted(set(prev_map) | set(curr_map)):
+        if name not in curr_map:
+            ops.append({"op": "remove", "ticket": name, "old": prev_map[name]})
+        elif name not in prev_map:
+            ops.append({"op": "add", "ticket": name, "value": curr_map[name]})
+        elif prev_map[name] != curr_map[name]:
+            ops.append({"op": "replace", "ticket": name, "old": prev_map[name], "value": curr_map[name]})
+    return ops
+
+def append_change_log(status_file, ops):
+    # One JSON line per detected change; history grows with changes, not with the ticket list
+    if not ops: return
+    entry = {"timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "ops": ops}
+    try:
+        with open(status_file + ".log", 'ab') as f: f.write(dump_json(entry, pretty=False) + b"\n")
+    except OSError as e: print(f"  ! Could not append change log: {e}")
+
 # --- HTML GENERATOR ---
+# (row style, status cell style) for a changed row, keyed by lowercased current status
+ROW_STYLES = {
+    "available": ("background-color: #d4edda;", "color: #155724; font-weight: bold;"),
+    "sold out": ("background-color: #f8d7da;", "color: #721c24; font-weight: bold;"),
+}
+OTHER_CHANGE_STYLE = ("background-color: #fff3cd;", "")
+
 def generate_diff_html(site_config, prev_status, curr_status):
-    url = site_config['url']
-    name = site_config['name']
+    # Ticket names and config values are scraped/user text, so escape everything interpolated
+    url = html.escape(site_config['url'])
+    name = html.escape(site_config['name'])
     
     prev_list = prev_status.get("General", {}).get("details", [])
     curr_list = curr_status.get("General", {}).get("details", [])
@@ -91,9 +427,9 @@ def generate_diff_html(site_config, prev_status, curr_status):
     prev_map = {t['name']: t['status'] for t in prev_list}
     curr_map = {t['name']: t['status'] for t in curr_list}
     
-    all_ticket_names = sorted(list(set(prev_map.keys()) | set(curr_map.keys())))
+    all_ticket_names = sorted(set(prev_map) | set(curr_map))
     
-    html = f"""
+    parts = [f"""
     <html>
     <body style="font-family: Arial, sans-serif;">
         <h3>Status Update for <a href="{url}" target="_blank" rel="nofollow noopener noreferrer">{name}</a></h3>
@@ -104,235 +440,321 @@ def generate_diff_html(site_config, prev_status, curr_status):
                 <th>Current Status</th>
                 <th>Previous Status</th>
             </tr>
-    """
+    """]
     
     changes_found = False
     
     for t_name in all_ticket_names:
         p_status = prev_map.get(t_name, "N/A")
-        if t_name in curr_map:
-            c_status = curr_map[t_name]
-        else:
-            c_status = "Sold out"
-            
-        row_style = ""
-        status_style = ""
+        c_status = curr_map.get(t_name, "Sold out")
+        c_lower = c_status.lower()
         
         if c_status != p_status:
             changes_found = True
-            if c_status.lower() == "available":
-                row_style = "background-color: #d4edda;"
-                status_style = "color: #155724; font-weight: bold;"
-            elif c_status.lower() == "sold out":
-                row_style = "background-color: #f8d7da;"
-                status_style = "color: #721c24; font-weight: bold;"
-            else:
-                row_style = "background-color: #fff3cd;"
+            row_style, status_style = ROW_STYLES.get(c_lower, OTHER_CHANGE_STYLE)
         else:
-            if c_status.lower() == "sold out":
-                 status_style = "color: #999;"
+            row_style = ""
+            status_style = "color: #999;" if c_lower == "sold out" else ""
             
-        html += f"""
+        parts.append(f"""
         <tr style="{row_style}">
-            <td>{t_name}</td>
-            <td style="{status_style}">{c_status}</td>
-            <td style="color: #666;">{p_status}</td>
+            <td>{html.escape(t_name)}</td>
+            <td style="{status_style}">{html.escape(c_status)}</td>
+            <td style="color: #666;">{html.escape(p_status)}</td>
         </tr>
-        """
+        """)
             
-    html += """
+    parts.append("""
         </table>
         <br>
         <p><small>Timestamp: {}</small></p>
     </body>
     </html>
-    """.format(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    """.format(datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
     
-    return html if changes_found else None
+    return "".join(parts) if changes_found else None
 
 # --- COOKIE HANDLING ---
 def handle_cookies(driver):
     end_time = time.time() + 2
     while time.time() < end_time:
         try:
-            host = driver.find_elements(By.ID, "usercentrics-root")
+            host = driver.find_elements(*USERCENTRICS_ROOT)
             if host:
                 shadow_root = driver.execute_script("return arguments[0].shadowRoot", host[0])
                 if shadow_root:
-                    accept_btn = shadow_root.find_element(By.CSS_SELECTOR, "button[data-testid='uc-accept-all-button']")
+                    accept_btn = shadow_root.find_element(*USERCENTRICS_ACCEPT)
                     if accept_btn.is_displayed():
                         driver.execute_script("arguments[0].click();", accept_btn)
                         return
         except: pass
 
-        selectors = [
-            "//button[contains(@class, 'rcb-btn-accept-all')]", 
-            "//button[normalize-space()='Accept all']",
-            "//a[normalize-space()='Accept all']"
-        ]
-        for xpath in selectors:
-            try:
-                btns = driver.find_elements(By.XPATH, xpath)
-                for btn in btns:
-                    if btn.is_displayed():
-                        driver.execute_script("arguments[0].click();", btn)
-                        return 
-            except: continue
+        try:
+            btns = driver.find_elements(*COOKIE_ACCEPT_BUTTONS)
+            for btn in btns:
+                if btn.is_displayed():
+                    driver.execute_script("arguments[0].click();", btn)
+                    return 
+        except: pass
         time.sleep(0.5)
 
 # --- SHARED NAVIGATION ---
+def any_present(css):
+    # Wait condition that checks several selectors in one round-trip instead of one find_elements each
+    return lambda d: d.execute_script("return !!document.querySelector(arguments[0]);", css)
 
-def click_back_button(driver):
+# Resolves as soon as arguments[0] matches, driven by a MutationObserver instead of polling from Python
+_WAIT_FOR_CSS_JS = r"""
+const css = arguments[0], timeout = arguments[1], done = arguments[arguments.length - 1];
+if (document.querySelector(css)) return done(true);
+const obs = new MutationObserver(() => {
+    if (document.querySelector(css)) { obs.disconnect(); clearTimeout(timer); done(true); }
+});
+const timer = setTimeout(() => { obs.disconnect(); done(!!document.querySelector(css)); }, timeout);
+obs.observe(document.documentElement, {childList: true, subtree: true});
+"""
+
+def wait_for_css(driver, css, timeout):
+    # One WebDriver round-trip per wait; falls back to polling if the page navigates mid-script
     try:
-        xpath = "//button[.//svg[contains(@class, 'lucide-chevron-left')] or .//div[contains(text(), 'Back')]]"
-        btns = driver.find_elements(By.XPATH, xpath)
-        for btn in btns:
-            if btn.is_displayed():
-                driver.execute_script("arguments[0].click();", btn)
-                return True
-    except: pass
-    return False
+        driver.set_script_timeout(timeout + 5)
+        return bool(driver.execute_async_script(_WAIT_FOR_CSS_JS, css, int(timeout * 1000)))
+    except InvalidSessionIdException: raise
+    except WebDriverException: pass
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=POLL_FREQUENCY).until(any_present(css))
+        return True
+    except TimeoutException: return False
+
+def click_back_button(driver):
+    return bool(driver.execute_script(_CLICK_BACK_JS))
 
 def wait_for_view_restoration(driver, text_to_find):
-    end_time = time.time() + 5
-    while time.time() < end_time:
-        try:
-            elements = driver.find_elements(By.CLASS_NAME, "card-list-item") + \
-                       driver.find_elements(By.XPATH, "//a[contains(@class, 'vi-rounded-lg')]")
-            for el in elements:
-                clean_el_text = normalize_text(el.text)
-                clean_target = normalize_text(text_to_find)
-                if clean_target in clean_el_text and el.is_displayed():
-                    return True
-        except: pass
-        time.sleep(0.5)
-    return False
+    try:
+        WebDriverWait(driver, 5, poll_frequency=POLL_FREQUENCY).until(
+            lambda d: d.execute_script(_VIEW_HAS_OPTION_JS, text_to_find)
+        )
+        return True
+    except TimeoutException: return False
+
+# Shared by the single-call DOM snippets below and the in-page menu walker
+_JS_HELPERS = r"""
+const norm = s => (s || '').replace(/[^\x00-\x7F]+/g, '').replace(/\s+/g, ' ').trim();
+const visible = el => !!(el && (el.offsetWidth || el.offsetHeight || el.getClientRects().length));
+const rows = () => Array.from(document.querySelectorAll('.ticket-type'));
+const links = () => Array.from(document.querySelectorAll("a[class*='vi-rounded-lg']"));
+const optionEls = () => {
+    const buttons = Array.from(document.querySelectorAll('.card-list-item'));
+    return buttons.length ? buttons : links();
+};
+const backButton = () => Array.from(document.querySelectorAll('button')).find(b => visible(b) && (
+    b.querySelector('svg.lucide-chevron-left') ||
+    Array.from(b.querySelectorAll('div')).some(d => d.textContent.includes('Back'))));
+const findOption = text =>
+    Array.from(document.querySelectorAll('.card-list-item')).find(b => visible(b) && norm(b.innerText) === text) ||
+    links().find(l => visible(l) && norm(l.innerText) === text) ||
+    links().find(l => visible(l) && norm(l.innerText).includes(text));
+"""
+
+# [[raw name, add button usable], ...] for every ticket row in one round-trip
+_SCRAPE_ROWS_JS = _JS_HELPERS + r"""
+return rows().map(row => {
+    const nameEl = row.querySelector('.vi-font-semibold');
+    const add = row.querySelector("button[aria-label^='Add']");
+    return [nameEl ? nameEl.innerText : row.innerText.split('\n')[0], visible(add) && !add.disabled];
+});
+"""
+
+# [raw label, href or null] for every visible menu option; href only for links to another page
+_OPTION_TEXTS_JS = _JS_HELPERS + r"""
+const here = location.href.split('#')[0];
+return optionEls().filter(visible).map(o => {
+    const textDiv = o.querySelector('.vi-font-medium');
+    const href = o.tagName === 'A' && /^https?:/.test(o.href) && o.href.split('#')[0] !== here ? o.href : null;
+    return [textDiv ? textDiv.innerText : o.innerText.split('\n')[0], href];
+});
+"""
+
+# True once a visible menu option containing arguments[0] is back on screen
+_VIEW_HAS_OPTION_JS = _JS_HELPERS + r"""
+const target = norm(arguments[0]);
+return Array.from(document.querySelectorAll('.card-list-item')).concat(links())
+    .some(el => visible(el) && norm(el.innerText).includes(target));
+"""
+
+# True if a visible fallback box says the sale has ended
+_SALE_ENDED_JS = _JS_HELPERS + r"""
+return Array.from(document.querySelectorAll('.fallback-box'))
+    .some(box => visible(box) && box.innerText.toLowerCase().includes('sale has ended'));
+"""
+
+# Clicks the visible Back button, if there is one
+_CLICK_BACK_JS = _JS_HELPERS + r"""
+const back = backButton();
+if (back) back.click();
+return !!back;
+"""
+
+# Finds the option whose normalized label matches arguments[0] and clicks it
+_CLICK_OPTION_JS = _JS_HELPERS + r"""
+const target = findOption(arguments[0]);
+if (!target) return false;
+target.click();
+return true;
+"""
 
 def scrape_current_view(driver, exclude_prefixes):
     tickets = []
-    rows = driver.find_elements(By.CLASS_NAME, "ticket-type")
     
-    if rows:
-        try:
-            WebDriverWait(driver, 5).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, ".ticket-type button[aria-label^='Add']"))
-            )
-        except TimeoutException: pass
-        rows = driver.find_elements(By.CLASS_NAME, "ticket-type")
+    if driver.find_elements(*TICKET_TYPE):
+        wait_for_css(driver, TICKET_ADD_BUTTON[1], 5)
 
-    for row in rows:
-        try:
-            try:
-                name_el = row.find_element(By.CLASS_NAME, "vi-font-semibold")
-                raw_name = name_el.text
-            except:
-                raw_name = row.text.split('\n')[0]
-            
-            name = normalize_text(raw_name)
-            
-            if any(name.lower().startswith(p.lower()) for p in exclude_prefixes):
-                continue
-                
-            status = "Sold out"
-            try:
-                add_btn = row.find_element(By.CSS_SELECTOR, "button[aria-label^='Add']")
-                if add_btn.is_displayed() and add_btn.is_enabled():
-                    status = "Available"
-            except NoSuchElementException: pass
-            
-            tickets.append({"name": name, "status": status})
-        except: continue
+    for raw_name, available in driver.execute_script(_SCRAPE_ROWS_JS) or []:
+        name = normalize_text(raw_name)
+        if not name or name.lower().startswith(exclude_prefixes):
+            continue
+        tickets.append({"name": name, "status": "Available" if available else "Sold out"})
     return tickets
 
 def traverse_menu(driver, exclude_prefixes, depth=0):
     found_tickets = []
     
-    try:
-        WebDriverWait(driver, 5).until(
-            lambda d: d.find_elements(By.CLASS_NAME, "card-list-item") or 
-                      d.find_elements(By.CLASS_NAME, "ticket-type") or
-                      d.find_elements(By.XPATH, "//a[contains(@class, 'vi-rounded-lg')]")
-        )
-    except TimeoutException: pass
+    wait_for_css(driver, MENU_CONTENT_CSS, 5)
 
     tickets_here = scrape_current_view(driver, exclude_prefixes)
     if tickets_here:
         print(f"    [Depth {depth}] Found {len(tickets_here)} tickets.")
         return tickets_here
 
-    options = []
-    buttons = driver.find_elements(By.CLASS_NAME, "card-list-item")
-    if buttons:
-        options = buttons
-    else:
-        cat_links = driver.find_elements(By.XPATH, "//a[contains(@class, 'vi-rounded-lg')]")
-        options = cat_links
-
-    if not options: return []
-        
-    option_list = []
-    for o in options:
-        if not o.is_displayed(): continue
-        try:
-            text_div = o.find_element(By.CLASS_NAME, "vi-font-medium")
-            raw = text_div.text
-        except:
-            raw = o.text.split('\n')[0]
-            
-        if raw and "Tickets available" not in raw and "Select" not in raw:
-            option_list.append(raw)
-            
-    option_list = list(dict.fromkeys(option_list))
+    options = {
+        raw: href for raw, href in (driver.execute_script(_OPTION_TEXTS_JS) or [])
+        if raw and "Tickets available" not in raw and "Select" not in raw
+    }
+    # When every option is a real link, open each one directly instead of click -> scrape -> Back -> wait,
+    # and come back to this view once at the end
+    direct = bool(options) and all(options.values())
+    start_url = driver.current_url if direct else None
+    last_text = None
 
-    for opt_text in option_list:
+    for opt_text, href in options.items():
         clean_opt_text = normalize_text(opt_text)
-        if any(clean_opt_text.lower().startswith(p.lower()) for p in exclude_prefixes):
+        if clean_opt_text.lower().startswith(exclude_prefixes):
             print(f"    [Depth {depth}] Skipping excluded: {clean_opt_text}")
             continue
 
-        print(f"    [Depth {depth}] Clicking option: {clean_opt_text}")
-        
-        target = None
-        
-        def is_match(element):
-            return clean_opt_text == normalize_text(element.text) and element.is_displayed()
-
-        fresh_btns = driver.find_elements(By.CLASS_NAME, "card-list-item")
-        for b in fresh_btns:
-            if is_match(b):
-                target = b
-                break
-        
-        if not target:
-            fresh_links = driver.find_elements(By.XPATH, "//a[contains(@class, 'vi-rounded-lg')]")
-            for l in fresh_links:
-                if is_match(l):
-                    target = l
-                    break
-        
-        if not target:
-             fresh_links = driver.find_elements(By.XPATH, "//a[contains(@class, 'vi-rounded-lg')]")
-             for l in fresh_links:
-                 if clean_opt_text in normalize_text(l.text) and l.is_displayed():
-                     target = l
-                     break
+        try:
+            if direct:
+                print(f"    [Depth {depth}] Opening option: {clean_opt_text}")
+                driver.get(href)
+                last_text = opt_text
+            else:
+                print(f"    [Depth {depth}] Clicking option: {clean_opt_text}")
+                if not driver.execute_script(_CLICK_OPTION_JS, clean_opt_text):
+                    continue
+                time.sleep(1.0)
 
-        if target:
-            try:
-                driver.execute_script("arguments[0].click();", target)
-                time.sleep(1.0) 
-                
-                results = traverse_menu(driver, exclude_prefixes, depth + 1)
-                found_tickets.extend(results)
-                
-                if click_back_button(driver):
-                    wait_for_view_restoration(driver, opt_text)
-                
-            except Exception as e:
-                print(f"    ! Error clicking {clean_opt_text}: {e}")
+            results = traverse_menu(driver, exclude_prefixes, depth + 1)
+            found_tickets.extend(results)
+
+            if not direct and click_back_button(driver):
+                wait_for_view_restoration(driver, opt_text)
+
+        except Exception as e:
+            print(f"    ! Error opening {clean_opt_text}: {e}")
+
+    if last_text is not None:
+        driver.get(start_url)
+        wait_for_view_restoration(driver, last_text)
 
     return found_tickets
 
+# Walks the whole category menu inside the page in one async script call, so the
+# Python side doesn't pay a WebDriver round-trip per click/back/poll.
+_ENUMERATE_MENU_JS = _JS_HELPERS + r"""
+const excludes = arguments[0];
+const maxDepth = arguments[1];
+const done = arguments[arguments.length - 1];
+const log = [];
+
+const excluded = s => { const l = s.toLowerCase(); return excludes.some(p => l.startsWith(p)); };
+
+const waitFor = (pred, timeout) => new Promise(resolve => {
+    if (pred()) return resolve(true);
+    const obs = new MutationObserver(() => {
+        if (pred()) { obs.disconnect(); clearTimeout(timer); resolve(true); }
+    });
+    const timer = setTimeout(() => { obs.disconnect(); resolve(!!pred()); }, timeout);
+    obs.observe(document.body, {childList: true, subtree: true, attributes: true});
+});
+
+const scrape = () => rows().flatMap(row => {
+    const nameEl = row.querySelector('.vi-font-semibold');
+    const name = norm(nameEl ? nameEl.innerText : row.innerText.split('\n')[0]);
+    if (!name || excluded(name)) return [];
+    const add = row.querySelector("button[aria-label^='Add']");
+    return [{name: name, status: (visible(add) && !add.disabled) ? 'Available' : 'Sold out'}];
+});
+
+const optionTexts = () => {
+    const texts = [];
+    for (const o of optionEls()) {
+        if (!visible(o)) continue;
+        const textDiv = o.querySelector('.vi-font-medium');
+        const raw = textDiv ? textDiv.innerText : o.innerText.split('\n')[0];
+        if (raw && !raw.includes('Tickets available') && !raw.includes('Select')) texts.push(norm(raw));
+    }
+    return Array.from(new Set(texts));
+};
+
+async function walk(depth) {
+    await waitFor(() => rows().length || optionEls().length, 5000);
+    if (rows().length) {
+        await waitFor(() => document.querySelector(".ticket-type button[aria-label^='Add']"), 5000);
+        const tickets = scrape();
+        if (tickets.length) {
+            log.push(`[Depth ${depth}] Found ${tickets.length} tickets.`);
+            return tickets;
+        }
+    }
+    if (depth >= maxDepth) return [];
+
+    const found = [];
+    for (const text of optionTexts()) {
+        if (excluded(text)) { log.push(`[Depth ${depth}] Skipping excluded: ${text}`); continue; }
+        const target = findOption(text);
+        if (!target) continue;
+
+        log.push(`[Depth ${depth}] Clicking option: ${text}`);
+        target.click();
+        if (!await waitFor(() => !target.isConnected || !visible(target) || rows().length, 5000)) {
+            log.push(`! View did not change after clicking ${text}`);
+            continue;
+        }
+        found.push(...await walk(depth + 1));
+
+        const back = backButton();
+        if (back) back.click(); else history.back();
+        await waitFor(() => !!findOption(text), 5000);
+    }
+    return found;
+}
+
+walk(0).then(tickets => done({tickets: tickets, log: log}), err => done({error: String(err), log: log}));
+"""
+# Must finish inside the client's read timeout, or the call dies client-side while chromedriver is
+# still busy with the script and the fallback's driver.get queues behind it
+MENU_SCRIPT_TIMEOUT = DRIVER_HTTP_TIMEOUT - 20
+MENU_MAX_DEPTH = 6
+
+def _enumerate_menu(driver, exclude_prefixes):
+    driver.set_script_timeout(MENU_SCRIPT_TIMEOUT)
+    result = driver.execute_async_script(_ENUMERATE_MENU_JS, list(exclude_prefixes), MENU_MAX_DEPTH)
+    for line in (result or {}).get("log", []):
+        print(f"    {line}")
+    if not result or result.get("error"):
+        raise RuntimeError((result or {}).get("error", "no result from menu script"))
+    return [{"name": normalize_text(t["name"]), "status": t["status"]} for t in result["tickets"]]
+
 def execute_checkout_scraping(driver, checkout_url, site_config):
     print(f"  > Clean Checkout URL: {checkout_url[:60]}...")
     driver.get(checkout_url)
@@ -341,35 +763,33 @@ def execute_checkout_scraping(driver, checkout_url, site_config):
     print("  > Waiting for content...")
     is_page_valid = False
     
-    try:
-        WebDriverWait(driver, 15).until(
-            lambda d: d.find_elements(By.CLASS_NAME, "card-list-item") or 
-                      d.find_elements(By.CLASS_NAME, "ticket-type") or
-                      d.find_elements(By.XPATH, "//a[contains(@class, 'vi-rounded-lg')]") or
-                      d.find_elements(By.CLASS_NAME, "fallback-box")
-        )
+    if wait_for_css(driver, MENU_CONTENT_CSS + ", .fallback-box", 15):
         is_page_valid = True
-    except TimeoutException:
+    else:
         print("  ! Checkout page did not load content (Timeout).")
         safe_name = site_config['name'].replace(' ', '_').replace("'", "")
         driver.save_screenshot(f"debug_failed_load_{safe_name}.png")
         return {"change_detected": False}
 
-    all_tickets = []
-    sale_ended_elements = driver.find_elements(By.CLASS_NAME, "fallback-box")
-    sale_ended_text = "sale has ended" in driver.page_source.lower()
-    sale_ended_flag = False
+    status_file = site_config['status_file']
+    # Read once: the raw bytes are compared with the new dump and parsed later for the diff
+    raw_status = read_bytes(status_file)
 
-    if sale_ended_elements:
-         for box in sale_ended_elements:
-             if box.is_displayed() and "sale has ended" in box.text.lower():
-                 sale_ended_flag = True
-                 break
+    all_tickets = []
+    sale_ended_flag = bool(driver.execute_script(_SALE_ENDED_JS))
 
     if sale_ended_flag:
         print("  > Detected 'Sale has ended'. Marking all tickets as Sold Out.")
     else:
-        all_tickets = traverse_menu(driver, site_config.get("exclude_prefixes", []))
+        # Lowercased once per site; str.startswith takes the whole tuple in one call
+        exclude_prefixes = tuple(p.lower() for p in site_config.get("exclude_prefixes", []))
+        try:
+            all_tickets = _enumerate_menu(driver, exclude_prefixes)
+        except Exception as e:
+            print(f"  ! In-page menu walk failed ({e}). Falling back to click traversal.")
+            driver.get(checkout_url)
+            handle_cookies(driver)
+            all_tickets = traverse_menu(driver, exclude_prefixes)
 
     current_status = {"General": {"found": is_page_valid, "details": []}}
     
@@ -381,17 +801,21 @@ def execute_checkout_scraping(driver, checkout_url, site_config):
         if not sale_ended_flag:
             print("  > No tickets found (All categories excluded).")
 
-    status_file = site_config['status_file']
-    try:
-        with open(status_file, 'r', encoding='utf-8') as f: previous_status = json.load(f)
-    except: previous_status = {}
+    # The status file is written by dump_json, so identical bytes mean identical status:
+    # skip parsing and the nested dict comparison on the common no-change run
+    current_bytes = dump_json(current_status)
+    if current_bytes == raw_status:
+        return {"change_detected": False}
+
+    try: previous_status = parse_json(raw_status) if raw_status.strip() else {}
+    except ValueError: previous_status = {}
 
-    if previous_status != current_status and current_status["General"]["found"]:
+    if canonical_json(previous_status) != canonical_json(current_status) and current_status["General"]["found"]:
         html_body = generate_diff_html(site_config, previous_status, current_status)
+        append_change_log(status_file, status_changes(previous_status, current_status))
         if html_body:
             print(f"  > CHANGE DETECTED!")
-            with open(status_file, 'w', encoding='utf-8') as f: 
-                json.dump(current_status, f, indent=2, ensure_ascii=False)
+            write_bytes(status_file, current_bytes)
             return {
                 "change_detected": True, 
                 "site_config": site_config,
@@ -399,8 +823,7 @@ def execute_checkout_scraping(driver, checkout_url, site_config):
             }
         else:
              print("  > Syncing status file (No visible change).")
-             with open(status_file, 'w', encoding='utf-8') as f: 
-                json.dump(current_status, f, indent=2, ensure_ascii=False)
+             write_bytes(status_file, current_bytes)
     
     return {"change_detected": False}
 
@@ -411,35 +834,28 @@ def _process_hyrox_event_page(site_config, driver):
     handle_cookies(driver)
     
     checkout_url = None
+    wait = WebDriverWait(driver, 5, poll_frequency=POLL_FREQUENCY)
     try:
-        buy_btn = WebDriverWait(driver, 5).until(
-            EC.element_to_be_clickable((By.XPATH, "//button[@aria-label='Buy Tickets here']"))
-        )
+        buy_btn = wait.until(EC.element_to_be_clickable(BUY_TICKETS_BUTTON))
         driver.execute_script("arguments[0].click();", buy_btn)
     except TimeoutException:
         print("    ! Could not find 'Buy Tickets here' button.")
         return {"change_detected": False}
 
+    # The waits below already cover the modal opening; no fixed sleeps in front of them
     try:
-        time.sleep(1) 
-        athlete_link = WebDriverWait(driver, 5).until(
-            EC.presence_of_element_located((By.XPATH, "//a[contains(., 'Athlete Tickets')]"))
-        )
+        athlete_link = wait.until(EC.presence_of_element_located(ATHLETE_TICKETS_LINK))
         driver.execute_script("arguments[0].click();", athlete_link)
         
-        time.sleep(2)
         try:
-            obj = WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.ID, "sellmodal-anchor"))
+            obj = WebDriverWait(driver, 10, poll_frequency=POLL_FREQUENCY).until(
+                EC.presence_of_element_located(SELLMODAL_ANCHOR)
             )
             raw_url = obj.get_attribute("data")
             checkout_url = clean_checkout_url(raw_url)
         except TimeoutException:
-            objs = driver.find_elements(By.TAG_NAME, "object")
-            for o in objs:
-                if "checkout" in (o.get_attribute("data") or ""):
-                    checkout_url = clean_checkout_url(o.get_attribute("data"))
-                    break
+            objs = driver.find_elements(*CHECKOUT_OBJECT)
+            if objs: checkout_url = clean_checkout_url(objs[0].get_attribute("data"))
     except Exception: pass
     
     if checkout_url:
@@ -448,22 +864,23 @@ def _process_hyrox_event_page(site_config, driver):
         print("  ! Failed to extract checkout URL.")
         return {"change_detected": False}
 
+# First visible link/button whose text contains a keyword, keywords tried in priority order
+_FIND_BUY_TARGET_JS = _JS_HELPERS + r"""
+const candidates = Array.from(document.querySelectorAll("a, button, [class*='btn'], [class*='button']"));
+for (const kw of arguments[0]) {
+    const hit = candidates.find(el => el.textContent.toLowerCase().includes(kw) && visible(el));
+    if (hit) return hit;
+}
+return null;
+"""
+
 def _process_hyrox_event_page_india(site_config, driver):
     print(f"  > [India Flow] Loading event page...")
     driver.get(site_config['url'])
     handle_cookies(driver)
     checkout_url = None
     try:
-        keywords = ["buy ticket", "register", "get ticket", "book now", "tickets"]
-        target = None
-        for kw in keywords:
-            if target: break
-            xpath = f"//*[(self::a or self::button or contains(@class, 'btn') or contains(@class, 'button')) and contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), '{kw}')]"
-            elements = driver.find_elements(By.XPATH, xpath)
-            for el in elements:
-                if el.is_displayed():
-                    target = el
-                    break
+        target = driver.execute_script(_FIND_BUY_TARGET_JS, INDIA_BUY_KEYWORDS)
         
         if target:
             if target.tag_name == 'a':
@@ -473,33 +890,36 @@ def _process_hyrox_event_page_india(site_config, driver):
             
             if not checkout_url:
                 current_url = driver.current_url
+                handles_before = set(driver.window_handles)
                 driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", target)
                 time.sleep(0.5)
                 try: target.click()
                 except: driver.execute_script("arguments[0].click();", target)
-                time.sleep(3) 
+                # Stop waiting as soon as the click navigates or opens a tab; modal shops still get the full 3s
+                try:
+                    WebDriverWait(driver, 3, poll_frequency=POLL_FREQUENCY).until(
+                        lambda d: d.current_url != current_url or len(d.window_handles) > len(handles_before)
+                    )
+                except TimeoutException: pass
                 
                 if driver.current_url != current_url and ("checkout" in driver.current_url or "vivenu" in driver.current_url):
                     checkout_url = clean_checkout_url(driver.current_url)
                 
-                if not checkout_url and len(driver.window_handles) > 1:
-                    driver.switch_to.window(driver.window_handles[-1])
+                new_handles = [h for h in driver.window_handles if h not in handles_before]
+                if not checkout_url and new_handles:
+                    driver.switch_to.window(new_handles[-1])
                     if "checkout" in driver.current_url or "vivenu" in driver.current_url:
                         checkout_url = clean_checkout_url(driver.current_url)
 
                 if not checkout_url:
-                    objs = driver.find_elements(By.ID, "sellmodal-anchor")
+                    objs = driver.find_elements(*SELLMODAL_ANCHOR)
                     if objs:
                         data = objs[0].get_attribute("data")
                         if data: checkout_url = clean_checkout_url(data)
                     
                     if not checkout_url:
-                        frames = driver.find_elements(By.TAG_NAME, "iframe")
-                        for f in frames:
-                            src = f.get_attribute("src")
-                            if src and ("checkout" in src or "vivenu" in src):
-                                checkout_url = clean_checkout_url(src)
-                                break
+                        frames = driver.find_elements(*CHECKOUT_IFRAME)
+                        if frames: checkout_url = clean_checkout_url(frames[0].get_attribute("src"))
     except Exception as e: print(f"    ! Error in India flow: {e}")
 
     if checkout_url:
@@ -509,19 +929,23 @@ def _process_hyrox_event_page_india(site_config, driver):
         return {"change_detected": False}
 
 # --- ON SALE CHECKER (RESTORED) ---
-def process_on_sale_site(site_config, driver):
+def process_on_sale_site(site_config, driver, page_html=None):
     name = site_config['name']
     url = site_config['url']
     if site_config.get('on_sale'): return {"change_detected": False}
     
     print(f"\n--- Checking On Sale: {name} ---")
-    driver.get(url)
-    handle_cookies(driver)
+    if page_html is None:
+        reset_browser_state(driver)
+        driver.get(url)
+        handle_cookies(driver)
+    else:
+        print("  > Using page fetched over HTTP.")
     
     try:
-        src = driver.page_source.lower()
+        src = (page_html if page_html is not None else driver.page_source).lower()
         # Simple check for keywords
-        if "buy tickets" in src or "register now" in src or "get tickets" in src:
+        if any(kw in src for kw in ON_SALE_KEYWORDS):
             print("  > ON SALE DETECTED!")
             site_config['on_sale'] = True
             return {"change_detected": True, "site_config": site_config}
@@ -535,6 +959,7 @@ def process_ticket_details_site(site_config, driver):
     site_type = site_config.get("site_type", "hyrox_event_page")
     
     print(f"\n--- Processing: {name} (Type: {site_type}) ---")
+    reset_browser_state(driver)
     try:
         if site_type == "hyrox_event_page":
             return _process_hyrox_event_page(site_config, driver)
@@ -543,11 +968,83 @@ def process_ticket_details_site(site_config, driver):
         else:
             print(f"  ! Unknown site_type: {site_type}")
             return {"change_detected": False}
+    except InvalidSessionIdException: raise
     except Exception as e:
         print(f"  ! Unexpected error: {e}")
         return {"change_detected": False}
+    finally:
+        _close_extra_windows(driver)
+
+def _close_extra_windows(driver):
+    # The worker's browser is reused for its next site, so leave it with just the original tab
+    try:
+        handles = driver.window_handles
+        for h in handles[1:]:
+            driver.switch_to.window(h)
+            driver.close()
+        driver.switch_to.window(handles[0])
+    except Exception: pass
+
+# One browser per pool process, started by the initializer and reused for every site that process gets
+_worker_driver = None
+_worker_headless = True
+_worker_profile = "worker"
+
+def _init_ticket_worker(headless, slot_counter):
+    global _worker_driver, _worker_headless, _worker_profile
+    # Stable slot numbers keep the same cached profile dirs warm from run to run
+    with slot_counter.get_lock():
+        slot_counter.value += 1
+        slot = slot_counter.value
+    _worker_headless = headless
+    _worker_profile = f"worker{slot}"
+    try: _worker_driver = setup_driver(headless, _worker_profile)
+    except Exception as e: print(f"Worker {slot} could not start Chrome: {e}")
+    # Runs when the pool shuts the process down (atexit doesn't fire in pool workers)
+    Finalize(None, _quit_worker_driver, exitpriority=10)
+
+def _quit_worker_driver():
+    global _worker_driver
+    if _worker_driver:
+        try: _worker_driver.quit()
+        except Exception: pass
+        _worker_driver = None
+
+def _ticket_site_worker(site_config):
+    global _worker_driver
+    # Workers run side by side, so a site's log is captured here and printed by main as one block
+    buf = io.StringIO()
+    with contextlib.redirect_stdout(buf):
+        try:
+            if _worker_driver is None: _worker_driver = setup_driver(_worker_headless, _worker_profile)
+            res, _worker_driver = run_site(process_ticket_details_site, site_config, _worker_driver, _worker_headless)
+        except Exception as e:
+            print(f"  ! Error processing {site_config['name']}: {e}")
+            res = {"change_detected": False}
+    res["output"] = buf.getvalue()
+    return res
 
 # --- MATRIX GENERATION ---
+def _rotated_label(text, font, font_size, length):
+    # Rotated column headers rarely change between runs, so keep them on disk
+    # Font family/style, not font.path: for load_default() that's an in-memory buffer whose repr changes every process
+    font_id = "|".join(font.getname()) if hasattr(font, 'getname') else type(font).__name__
+    key = hashlib.sha1(f"{text}|{font_id}|{font_size}|{length}".encode()).hexdigest()[:12]
+    cache_path = os.path.join(LABEL_CACHE_DIR, f"{key}.png")
+    try:
+        with Image.open(cache_path) as cached:
+            return cached.copy()
+    except Exception: pass
+
+    txt = Image.new('L', (length, font_size + 10))
+    ImageDraw.Draw(txt).text((0, 0), text, font=font, fill=255)
+    r_txt = txt.rotate(90, expand=1)
+    try:
+        os.makedirs(LABEL_CACHE_DIR, exist_ok=True)
+        r_txt.save(cache_path)
+    except OSError as e: print(f"Could not cache label '{text}': {e}")
+    return r_txt
+
 def generate_availability_matrix():
     print("Generating matrix...")
     DISPLAY_CATEGORIES = [
@@ -556,17 +1053,18 @@ def generate_availability_matrix():
         "HYROX DOUBLES WOMEN", "HYROX DOUBLES MIXED", "HYROX DOUBLES MEN",
         "HYROX WOMENS RELAY", "HYROX MENS RELAY", "HYROX MIXED RELAY"
     ]
-    MATCHING_CATEGORIES = sorted(DISPLAY_CATEGORIES, key=len, reverse=True)
+    # Longest first so e.g. PRO WOMEN wins over WOMEN; normalized once here rather than per ticket
+    MATCHING_CATEGORIES = [(c, _normalize_for_matrix(c)) for c in sorted(DISPLAY_CATEGORIES, key=len, reverse=True)]
     CELL_SIZE = 40; COL_HEADER_HEIGHT = 150; ROW_HEADER_WIDTH = 250; PADDING = 20
-    FONT_SIZE = 14; AVAILABLE_COLOR = "#77DD77"; UNAVAILABLE_COLOR = "#FF6961"
+    FONT_SIZE = 14; AVAILABLE_COLOR = "#77DD77"; UNAVAILABLE_COLOR = "#FF6961"; GRID_COLOR = "#D3D3D3"
     
     try:
-        with open(TICKET_DETAILS_CONFIG, 'r') as f: config = json.load(f)
+        config = load_json(TICKET_DETAILS_CONFIG)
         sites = config.get("sites", [])
     except: return
 
     try:
-        with open(MATRIX_STATE_FILE, 'r') as f: prev_matrix = json.load(f)
+        prev_matrix = load_json(MATRIX_STATE_FILE)
     except: prev_matrix = {}
 
     site_names = [s['name'] for s in sites]
@@ -574,17 +1072,22 @@ def generate_availability_matrix():
 
     for site in sites:
         try:
-            with open(site['status_file'], 'r') as f: data = json.load(f)
+            data = load_json(site['status_file'])
             tickets = []
             for k, v in data.items():
                 if "details" in v: tickets.extend(v["details"])
             
+            row = curr_matrix[site['name']]
+            pending = len(DISPLAY_CATEGORIES)
             for t in tickets:
+                if not pending: break
                 if t.get("status") == "Available":
                     norm_name = _normalize_for_matrix(t.get("name", ""))
-                    for cat in MATCHING_CATEGORIES:
-                        if _normalize_for_matrix(cat) in norm_name:
-                            curr_matrix[site['name']][cat] = True
+                    for cat, norm_cat in MATCHING_CATEGORIES:
+                        if norm_cat in norm_name:
+                            if not row[cat]:
+                                row[cat] = True
+                                pending -= 1
                             break
         except: pass
 
@@ -600,23 +1103,40 @@ def generate_availability_matrix():
     for i, name in enumerate(site_names):
         x = ROW_HEADER_WIDTH + (i * CELL_SIZE) + (CELL_SIZE / 2) + PADDING
         y = COL_HEADER_HEIGHT - 10 + PADDING
-        txt = Image.new('L', (COL_HEADER_HEIGHT, FONT_SIZE + 10))
-        d = ImageDraw.Draw(txt)
-        d.text((0, 0), name, font=font, fill=255)
-        r_txt = txt.rotate(90, expand=1)
+        r_txt = _rotated_label(name, font, FONT_SIZE, COL_HEADER_HEIGHT)
         img.paste("#000000", (int(x - r_txt.size[0]/2), int(y - r_txt.size[1])), r_txt)
 
     for i, cat in enumerate(DISPLAY_CATEGORIES):
         draw.text((PADDING, COL_HEADER_HEIGHT + (i * CELL_SIZE) + 20 + PADDING), cat, font=font, fill="black", anchor="lm")
         
+    # Build the cell grid as one pixel per cell, then scale it up in a single C-level resize
+    grid_x = ROW_HEADER_WIDTH + PADDING
+    grid_y = COL_HEADER_HEIGHT + PADDING
+    avail_rgb = ImageColor.getrgb(AVAILABLE_COLOR)
+    unavail_rgb = ImageColor.getrgb(UNAVAILABLE_COLOR)
+    if site_names:
+        cells = Image.new('RGB', (len(site_names), len(DISPLAY_CATEGORIES)))
+        cells.putdata([
+            avail_rgb if curr_matrix[name][cat] else unavail_rgb
+            for cat in DISPLAY_CATEGORIES for name in site_names
+        ])
+        cells = cells.resize((len(site_names) * CELL_SIZE, len(DISPLAY_CATEGORIES) * CELL_SIZE), Image.NEAREST)
+        img.paste(cells, (grid_x, grid_y))
+
+    grid_w = len(site_names) * CELL_SIZE
+    grid_h = len(DISPLAY_CATEGORIES) * CELL_SIZE
+    for c in range(len(site_names) + 1):
+        x = grid_x + c * CELL_SIZE
+        draw.line([(x, grid_y), (x, grid_y + grid_h)], fill=GRID_COLOR)
+    for r in range(len(DISPLAY_CATEGORIES) + 1):
+        y = grid_y + r * CELL_SIZE
+        draw.line([(grid_x, y), (grid_x + grid_w, y)], fill=GRID_COLOR)
+
     for r, cat in enumerate(DISPLAY_CATEGORIES):
-        y1 = COL_HEADER_HEIGHT + (r * CELL_SIZE) + PADDING
+        y1 = grid_y + (r * CELL_SIZE)
         for c, name in enumerate(site_names):
-            x1 = ROW_HEADER_WIDTH + (c * CELL_SIZE) + PADDING
-            avail = curr_matrix.get(name, {}).get(cat, False)
-            color = AVAILABLE_COLOR if avail else UNAVAILABLE_COLOR
-            draw.rectangle([x1, y1, x1+CELL_SIZE, y1+CELL_SIZE], fill=color, outline="#D3D3D3")
-            if avail != prev_matrix.get(name, {}).get(cat, False):
+            if curr_matrix[name][cat] != prev_matrix.get(name, {}).get(cat, False):
+                x1 = grid_x + (c * CELL_SIZE)
                 draw.text((x1+20, y1+20), "X", font=font, fill="black", anchor="mm")
 
     try:
@@ -624,20 +1144,23 @@ def generate_availability_matrix():
         draw.text((w - PADDING, PADDING), ts, font=font, fill="black", anchor="ra")
     except: pass
     
-    img.save(MATRIX_OUTPUT_FILE)
+    # Only a handful of flat colours plus anti-aliased text, so a small palette keeps the attachment tiny
+    img = img.convert('P', palette=Image.ADAPTIVE, colors=16)
+    img.save(MATRIX_OUTPUT_FILE, optimize=True, compress_level=9)
     print(f"Matrix saved to {MATRIX_OUTPUT_FILE}")
     
-    if curr_matrix != prev_matrix:
-        with open(MATRIX_STATE_FILE, 'w') as f: json.dump(curr_matrix, f, indent=2)
-        set_github_output('matrix_changed', 'true')
-    else:
-        set_github_output('matrix_changed', 'false')
+    with GithubOutput() as gh_out:
+        if canonical_json(curr_matrix) != canonical_json(prev_matrix):
+            save_json(MATRIX_STATE_FILE, curr_matrix)
+            gh_out.emit('matrix_changed', 'true')
+        else:
+            gh_out.emit('matrix_changed', 'false')
 
 def email_matrix():
     mail_user = os.getenv('MAIL_USERNAME'); mail_pass = os.getenv('MAIL_PASSWORD')
     if not (mail_user and mail_pass): return
     try:
-        with open(TICKET_DETAILS_CONFIG, 'r') as f: rcpt = json.load(f).get("matrix_email_to")
+        rcpt = load_json(TICKET_DETAILS_CONFIG).get("matrix_email_to")
     except: return
     
     mst = pytz.timezone('Asia/Kuala_Lumpur')
@@ -649,51 +1172,95 @@ def email_matrix():
 def main(headless=True):
     mail_user = os.getenv('MAIL_USERNAME'); mail_pass = os.getenv('MAIL_PASSWORD')
     change = False
+    outbox = []
     
-    driver = setup_driver(headless)
+    # Only started if an on-sale page actually needs the browser
+    driver = None
     
-    # 1. Check On Sale (Restored Loop)
-    try:
-        with open(ON_SALE_CONFIG, 'r') as f: on_sale_sites = json.load(f)
-        os_updated = False
-        for s in on_sale_sites:
-            try:
-                res = process_on_sale_site(s, driver)
-                if res.get("change_detected"):
-                    change = True
-                    os_updated = True
-                    if mail_user and mail_pass and res['site_config'].get("email_to"):
-                        subj = f"[{s['name']}] Tickets are ON SALE!"
-                        body = f"<html><body><p>Go to: <a href='{s['url']}'>{s['url']}</a></p></body></html>"
-                        send_email(subj, body, res['site_config']['email_to'], mail_user, mail_pass)
-            except Exception as e: print(f"Error checking OS {s['name']}: {e}")
-        
-        if os_updated:
-            with open(ON_SALE_CONFIG, 'w') as f: json.dump(on_sale_sites, f, indent=2)
-            
-    except: pass
+    try: on_sale_sites = load_json(ON_SALE_CONFIG)
+    except Exception as e:
+        print(f"Could not load {ON_SALE_CONFIG}: {e}")
+        on_sale_sites = []
+    try: sites = load_json(TICKET_DETAILS_CONFIG)["sites"]
+    except Exception as e:
+        print(f"Fatal Error: {e}")
+        sites = []
+
+    # Sites already flagged on sale are never re-checked; with nothing else configured, skip all of it
+    pending_on_sale = [s for s in on_sale_sites if not s.get('on_sale')]
+    if not sites and not pending_on_sale:
+        print("Nothing left to check; skipping browser setup.")
+        return
+
+    # On-sale pages flagged "use_browser" need JS to render; the rest are plain HTML, fetched in one concurrent batch.
+    # Requests are conditional: a page unchanged since the last run (304 or same hash) was not on sale then either.
+    http_cache = load_http_cache()
+    on_sale_pages, fresh_validators = prefetch_pages(
+        [s['url'] for s in pending_on_sale if not s.get('use_browser')], http_cache)
+    # Selenium Manager lookup is only worth it if some browser will actually start
+    if sites or any(on_sale_pages.get(s['url']) is None for s in pending_on_sale):
+        resolve_chrome_binaries()
 
-    # 2. Check Detailed Tickets
     try:
-        with open(TICKET_DETAILS_CONFIG, 'r') as f: sites = json.load(f)["sites"]
-        
-        for s in sites:
+        # Detailed tickets run in worker processes (one browser each, reused across that worker's sites)
+        # while the on-sale checks run here
+        workers = max(1, min(len(sites), os.cpu_count() or 1))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_ticket_worker,
+                                 initargs=(headless, Value('i', 0))) as pool:
+            futures = {pool.submit(_ticket_site_worker, s): s for s in sites}
+
+            # 1. Check On Sale (Restored Loop)
             try:
-                res = process_ticket_details_site(s, driver)
-                if res.get("change_detected"):
-                    change = True
-                    if mail_user and mail_pass and res['site_config'].get("email_to"):
-                        subject = f"[{s['name']}] Status Change Detected"
-                        html_body = res.get("html_body", "No details")
-                        send_email(subject, html_body, res['site_config']['email_to'], mail_user, mail_pass)
-            except Exception as e:
-                print(f"Error processing {s['name']}: {e}")
+                os_updated = False
+                for s in pending_on_sale:
+                    try:
+                        page_html = on_sale_pages.get(s['url'])
+                        if page_html is NOT_MODIFIED:
+                            print(f"\n--- Checking On Sale: {s['name']} --- unchanged since last run, skipping.")
+                            continue
+                        if page_html is None and driver is None:
+                            driver = setup_driver(headless)
+                        res, driver = run_site(process_on_sale_site, s, driver, headless, page_html=page_html)
+                        # Only now has this version of the page actually been checked
+                        if s['url'] in fresh_validators: http_cache[s['url']] = fresh_validators[s['url']]
+                        if res.get("change_detected"):
+                            change = True
+                            os_updated = True
+                            if mail_user and mail_pass and res['site_config'].get("email_to"):
+                                subj = f"[{s['name']}] Tickets are ON SALE!"
+                                url = html.escape(s['url'])
+                                body = f"<html><body><p>Go to: <a href='{url}'>{url}</a></p></body></html>"
+                                outbox.append(_build_msg(subj, body, res['site_config']['email_to'], mail_user))
+                    except Exception as e: print(f"Error checking OS {s['name']}: {e}")
+
+                if os_updated:
+                    save_json(ON_SALE_CONFIG, on_sale_sites)
+            except: pass
+
+            # 2. Collect Detailed Tickets
+            for fut in as_completed(futures):
+                s = futures[fut]
+                try:
+                    res = fut.result()
+                    print(res.get("output", ""), end="", flush=True)
+                    if res.get("change_detected"):
+                        change = True
+                        if mail_user and mail_pass and res['site_config'].get("email_to"):
+                            subject = f"[{s['name']}] Status Change Detected"
+                            html_body = res.get("html_body", "No details")
+                            outbox.append(_build_msg(subject, html_body, res['site_config']['email_to'], mail_user))
+                except Exception as e:
+                    print(f"Error processing {s['name']}: {e}")
                 
     except Exception as e: print(f"Fatal Error: {e}")
     finally:
-        driver.quit()
+        # Machine-only file, so no indentation; the committed status files stay pretty for readable diffs
+        if http_cache: save_json(HTTP_CACHE_FILE, http_cache, pretty=False)
+        send_many(outbox, mail_user, mail_pass)
+        if driver: driver.quit()
         
-    if change: set_github_output('changes_detected', 'true')
+    with GithubOutput() as gh_out:
+        if change: gh_out.emit('changes_detected', 'true')
 
 if __name__ == "__main__":
     is_headless = "--visible" not in sys.argv